@@ -1,6 +1,7 @@
 import streamlit as st
 from datetime import date
 from db import init_db
+from drafts import flush_pending_draft
 
 st.set_page_config(
     page_title="Travel Journal",
@@ -9,6 +10,7 @@ st.set_page_config(
 )
 
 init_db()
+flush_pending_draft()
 
 st.title("📓 Travel Journal MVP")
 st.caption("Capture your day in seconds. Turn it into a beautiful scrapbook-style journal page.")
@@ -0,0 +1,267 @@
+"""
+Online, incremental backups of the journal DB and media.
+
+    python backup.py create            # new snapshot under backups/
+    python backup.py list
+    python backup.py verify [SNAPSHOT]
+    python backup.py restore [SNAPSHOT]
+
+Each snapshot is a self-contained folder:
+
+    backups/<snapshot_id>/
+      journal.db       consistent copy made with the SQLite online backup API
+      media/...        one file per media file; unchanged files are hard links
+      manifest.json    sha256 + size of every file in the snapshot
+
+Media snapshots cover the local backend (MEDIA_STORAGE=local). With the S3
+backend, rely on bucket versioning/replication for media; the DB is still backed up here.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import DB_PATH
+from storage import MEDIA_DIR, TEMP_SUFFIX
+
+BACKUP_DIR = Path("backups")
+MANIFEST_NAME = "manifest.json"
+DB_NAME = "journal.db"
+
+# Copy the DB a few MB at a time and yield between steps so the app can keep writing.
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.005
+
+_CHUNK = 1024 * 1024
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _new_snapshot_id(dest: Path) -> str:
+    base = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    snap_id, n = base, 1
+    while (dest / snap_id).exists() or (dest / f"{snap_id}.partial").exists():
+        n += 1
+        snap_id = f"{base}-{n:03d}"
+    return snap_id
+
+
+def _snapshot_sort_key(snapshot: Path) -> Tuple[str, int]:
+    # "<timestamp>" or "<timestamp>-<n>"; compare n as a number so -10 sorts after -2.
+    base, _, suffix = snapshot.name.partition("-")
+    return base, int(suffix) if suffix.isdigit() else 0
+
+
+def list_snapshots(dest: Path = BACKUP_DIR) -> List[Path]:
+    """Completed snapshots, oldest first."""
+    if not dest.exists():
+        return []
+    return sorted(
+        (p for p in dest.iterdir() if p.is_dir() and (p / MANIFEST_NAME).exists()),
+        key=_snapshot_sort_key,
+    )
+
+
+def load_manifest(snapshot: Path) -> Dict[str, Any]:
+    return json.loads((snapshot / MANIFEST_NAME).read_text(encoding="utf-8"))
+
+
+def _online_copy(src_path: Path, dst_path: Path) -> None:
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        with dst:
+            src.backup(dst, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _check_db(path: Path) -> None:
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check;").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise RuntimeError(f"integrity_check failed for {path}: {result}")
+
+
+def _snapshot_media(media_dir: Path, out_dir: Path, previous: Optional[Path]) -> Dict[str, Dict[str, Any]]:
+    prev_media: Dict[str, Dict[str, Any]] = load_manifest(previous)["media"] if previous else {}
+    entries: Dict[str, Dict[str, Any]] = {}
+
+    # Skip uploads still being written; they land in the next snapshot.
+    files = (p for p in media_dir.rglob("*") if p.is_file() and not p.name.endswith((TEMP_SUFFIX, ".restoring")))
+    for src in sorted(files):
+        rel = src.relative_to(media_dir).as_posix()
+        st = src.stat()
+        prev = prev_media.get(rel)
+
+        # Same size and mtime as last time: trust the recorded digest instead of re-reading the file.
+        if prev and prev["size"] == st.st_size and prev.get("mtime_ns") == st.st_mtime_ns:
+            digest = prev["sha256"]
+        else:
+            digest = _sha256_file(src)
+
+        dst = out_dir / rel
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if prev and previous and prev["sha256"] == digest:
+            try:
+                os.link(previous / "media" / rel, dst)
+            except OSError:
+                # Different filesystem or no hard link support: fall back to a real copy.
+                shutil.copy2(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+        entries[rel] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return entries
+
+
+def create_snapshot(
+    dest: Path = BACKUP_DIR,
+    db_path: Path = DB_PATH,
+    media_dir: Path = MEDIA_DIR,
+) -> Path:
+    dest.mkdir(parents=True, exist_ok=True)
+    snapshots = list_snapshots(dest)
+    previous = snapshots[-1] if snapshots else None
+
+    snap_id = _new_snapshot_id(dest)
+    work = dest / f"{snap_id}.partial"
+    work.mkdir()
+    try:
+        db_out = work / DB_NAME
+        _online_copy(db_path, db_out)
+        _check_db(db_out)
+
+        media = _snapshot_media(media_dir, work / "media", previous)
+
+        manifest = {
+            "id": snap_id,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "previous": previous.name if previous else None,
+            "db": {"sha256": _sha256_file(db_out), "size": db_out.stat().st_size},
+            "media": media,
+        }
+        (work / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+
+    # Only a fully written snapshot gets its final name, so list_snapshots() never sees a torn one.
+    final = dest / snap_id
+    work.rename(final)
+    return final
+
+
+def verify_snapshot(snapshot: Path) -> List[str]:
+    """Returns a list of problems; empty means the snapshot is intact."""
+    manifest = load_manifest(snapshot)
+    problems: List[str] = []
+
+    db_file = snapshot / DB_NAME
+    if not db_file.exists():
+        problems.append(f"missing {DB_NAME}")
+    elif _sha256_file(db_file) != manifest["db"]["sha256"]:
+        problems.append(f"digest mismatch: {DB_NAME}")
+    else:
+        try:
+            _check_db(db_file)
+        except (RuntimeError, sqlite3.DatabaseError) as e:
+            problems.append(str(e))
+
+    for rel, meta in manifest["media"].items():
+        path = snapshot / "media" / rel
+        if not path.exists():
+            problems.append(f"missing media/{rel}")
+        elif path.stat().st_size != meta["size"] or _sha256_file(path) != meta["sha256"]:
+            problems.append(f"digest mismatch: media/{rel}")
+    return problems
+
+
+def restore_snapshot(
+    snapshot: Path,
+    db_path: Path = DB_PATH,
+    media_dir: Path = MEDIA_DIR,
+) -> None:
+    problems = verify_snapshot(snapshot)
+    if problems:
+        raise RuntimeError(f"refusing to restore {snapshot.name}: " + "; ".join(problems))
+
+    manifest = load_manifest(snapshot)
+
+    # Media first, so the restored DB never points at files that are not there yet.
+    for rel, meta in manifest["media"].items():
+        target = media_dir / rel
+        if target.exists() and target.stat().st_size == meta["size"] and _sha256_file(target) == meta["sha256"]:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".restoring")
+        shutil.copy2(snapshot / "media" / rel, tmp)
+        os.replace(tmp, target)
+
+    # Restoring through the backup API keeps the swap atomic for any open connections.
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    _online_copy(snapshot / DB_NAME, db_path)
+    _check_db(db_path)
+
+
+def _resolve(dest: Path, name: Optional[str]) -> Path:
+    if name:
+        snapshot = dest / name
+        if not (snapshot / MANIFEST_NAME).exists():
+            raise SystemExit(f"No snapshot named {name} in {dest}")
+        return snapshot
+    snapshots = list_snapshots(dest)
+    if not snapshots:
+        raise SystemExit(f"No snapshots in {dest}")
+    return snapshots[-1]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Back up and restore the journal DB and media.")
+    parser.add_argument("--dest", type=Path, default=BACKUP_DIR, help="Folder that holds the snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="Take a new incremental snapshot.")
+    sub.add_parser("list", help="List snapshots.")
+    for name, help_text in [("verify", "Check a snapshot's digests."), ("restore", "Verify, then restore a snapshot.")]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("snapshot", nargs="?", help="Snapshot id (defaults to the latest).")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        snapshot = create_snapshot(args.dest)
+        print(f"Created {snapshot}")
+    elif args.command == "list":
+        for snapshot in list_snapshots(args.dest):
+            manifest = load_manifest(snapshot)
+            print(f"{snapshot.name}  {len(manifest['media'])} media files")
+    elif args.command == "verify":
+        snapshot = _resolve(args.dest, args.snapshot)
+        problems = verify_snapshot(snapshot)
+        for p in problems:
+            print(p)
+        print(f"{snapshot.name}: {'OK' if not problems else f'{len(problems)} problem(s)'}")
+        return 1 if problems else 0
+    elif args.command == "restore":
+        snapshot = _resolve(args.dest, args.snapshot)
+        restore_snapshot(snapshot)
+        print(f"Restored {snapshot.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
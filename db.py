@@ -1,4 +1,5 @@
 import sqlite3
+import threading
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -23,8 +24,10 @@ CREATE TABLE IF NOT EXISTS media (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     entry_id INTEGER NOT NULL,
     media_type TEXT NOT NULL, -- photo | video
-    file_path TEXT NOT NULL,
+    file_path TEXT NOT NULL, -- storage key, see storage.py (not a local path)
     original_name TEXT NOT NULL,
+    phash TEXT,      -- 64-bit dHash as 16 hex chars (photos only), see media_index.py
+    sharpness REAL,  -- higher = crisper; picks the best shot among near-duplicates
     created_at TEXT NOT NULL DEFAULT (datetime('now')),
     FOREIGN KEY(entry_id) REFERENCES entries(id) ON DELETE CASCADE
 );
@@ -39,9 +42,42 @@ def _conn() -> sqlite3.Connection:
 
     # IMPORTANT: ensure schema exists no matter which page loads first
     conn.executescript(_SCHEMA)
+    _migrate_once(conn)
 
     return conn
 
+# Columns added after the first release: (table, column, type)
+_ADDED_COLUMNS = [
+    ("media", "phash", "TEXT"),
+    ("media", "sharpness", "REAL"),
+]
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+def _migrate_once(conn: sqlite3.Connection) -> None:
+    # Streamlit serves sessions on separate threads; only the first connection migrates.
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            _migrate(conn)
+            _migrated = True
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    # Databases created before these columns existed
+    for table, column, col_type in _ADDED_COLUMNS:
+        cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if column in cols:
+            continue
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+        except sqlite3.OperationalError as e:
+            # Another process (e.g. a second app replica) got there first.
+            if "duplicate column" not in str(e):
+                raise
+
 def init_db() -> None:
     # Kept for compatibility; schema is already ensured in _conn()
     with _conn() as conn:
@@ -83,17 +119,31 @@ def upsert_entry(
         )
         return int(cur.lastrowid)
 
-def add_media(entry_id: int, media_type: str, file_path: str, original_name: str) -> int:
+def add_media(
+    entry_id: int,
+    media_type: str,
+    file_path: str,
+    original_name: str,
+    phash: Optional[str] = None,
+    sharpness: Optional[float] = None,
+) -> int:
     with _conn() as conn:
         cur = conn.execute(
             """
-            INSERT INTO media (entry_id, media_type, file_path, original_name)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO media (entry_id, media_type, file_path, original_name, phash, sharpness)
+            VALUES (?, ?, ?, ?, ?, ?)
             """,
-            (entry_id, media_type, file_path, original_name),
+            (entry_id, media_type, file_path, original_name, phash, sharpness),
         )
         return int(cur.lastrowid)
 
+def set_media_fingerprint(media_id: int, phash: Optional[str], sharpness: Optional[float]) -> None:
+    with _conn() as conn:
+        conn.execute(
+            "UPDATE media SET phash = ?, sharpness = ? WHERE id = ?",
+            (phash, sharpness, media_id),
+        )
+
 def list_entries(user_id: str) -> List[Tuple[Any, ...]]:
     with _conn() as conn:
         cur = conn.execute(
@@ -127,21 +177,68 @@ def list_media(entry_id: int) -> List[Dict[str, Any]]:
     with _conn() as conn:
         cur = conn.execute(
             """
-            SELECT id, media_type, file_path, original_name, created_at
+            SELECT id, media_type, file_path, original_name, created_at, phash, sharpness
             FROM media
             WHERE entry_id = ?
             ORDER BY id ASC
             """,
             (entry_id,),
         )
-        rows = cur.fetchall()
+        return [_media_row(r) for r in cur.fetchall()]
+
+def list_journal_media(user_id: str) -> List[Dict[str, Any]]:
+    with _conn() as conn:
+        cur = conn.execute(
+            """
+            SELECT m.id, m.media_type, m.file_path, m.original_name, m.created_at, m.phash, m.sharpness, m.entry_id
+            FROM media m
+            JOIN entries e ON e.id = m.entry_id
+            WHERE e.user_id = ?
+            ORDER BY m.id ASC
+            """,
+            (user_id,),
+        )
         out = []
-        for r in rows:
-            out.append({
-                "id": r[0],
-                "media_type": r[1],
-                "file_path": r[2],
-                "original_name": r[3],
-                "created_at": r[4],
-            })
+        for r in cur.fetchall():
+            item = _media_row(r)
+            item["entry_id"] = r[7]
+            out.append(item)
         return out
+
+def _media_row(r: Tuple[Any, ...]) -> Dict[str, Any]:
+    return {
+        "id": r[0],
+        "media_type": r[1],
+        "file_path": r[2],
+        "original_name": r[3],
+        "created_at": r[4],
+        "phash": r[5],
+        "sharpness": r[6],
+    }
+
+def get_entry_by_date(user_id: str, entry_date: str) -> Optional[Dict[str, Any]]:
+    with _conn() as conn:
+        cur = conn.execute(
+            "SELECT id FROM entries WHERE user_id = ? AND entry_date = ?",
+            (user_id, entry_date),
+        )
+        row = cur.fetchone()
+    return get_entry(int(row[0])) if row else None
+
+def save_draft(user_id: str, entry_date: str, mood: str, answers_json: str) -> bool:
+    """
+    Autosave path: one statement, and it never touches an entry that is already
+    complete/generated. Returns True if a row was written.
+    """
+    with _conn() as conn:
+        cur = conn.execute(
+            """
+            INSERT INTO entries (user_id, entry_date, mood, answers_json, status)
+            VALUES (?, ?, ?, ?, 'draft')
+            ON CONFLICT(user_id, entry_date) DO UPDATE
+            SET mood = excluded.mood, answers_json = excluded.answers_json, updated_at = datetime('now')
+            WHERE entries.status = 'draft'
+            """,
+            (user_id, entry_date, mood, answers_json),
+        )
+        return cur.rowcount > 0
@@ -0,0 +1,119 @@
+"""
+Write-behind autosave for New Entry drafts.
+
+Every Streamlit rerun pushes the current form into a DraftBuffer kept in
+session state. The buffer only hits db.py when the form has been quiet for
+DRAFT_DEBOUNCE_SECONDS (or has been changing for DRAFT_MAX_WAIT_SECONDS), when
+the user leaves the page, and never when the serialized answers are unchanged.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import streamlit as st
+
+from db import get_entry_by_date, save_draft
+from utils import safe_json_dumps, safe_json_loads
+
+DRAFT_DEBOUNCE_SECONDS = 3.0
+DRAFT_MAX_WAIT_SECONDS = 15.0
+
+_STATE_KEY = "draft_buffer"
+
+
+@dataclass
+class DraftBuffer:
+    user_id: str
+    entry_date: str = ""
+    mood: str = ""
+    answers: Dict[str, Any] = field(default_factory=dict)
+    # Serialized form of what the DB already holds; None = not known yet.
+    persisted: Optional[str] = None
+    # The date already has a complete/generated entry, so autosave stays off.
+    locked: bool = False
+    first_change_at: float = 0.0
+    last_change_at: float = 0.0
+    last_flush_at: float = 0.0
+
+    def _serialized(self) -> str:
+        return safe_json_dumps({"mood": self.mood, "answers": self.answers})
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.entry_date) and not self.locked and self._serialized() != self.persisted
+
+    def load(self, entry_date: str) -> Optional[Dict[str, Any]]:
+        """
+        Switch the buffer to entry_date. Returns the stored draft
+        ({"mood", "answers"}) if there is one to restore into the form.
+        """
+        # Edits still waiting on the debounce belong to the date they were typed for.
+        self.flush()
+
+        self.entry_date = entry_date
+        self.locked = False
+        self.first_change_at = self.last_change_at = 0.0
+        # Whatever the form shows next is the baseline for this date, not an edit:
+        # nothing is written here until the user changes something.
+        self.persisted = None
+
+        entry = get_entry_by_date(self.user_id, entry_date)
+        if entry and entry["status"] != "draft":
+            self.locked = True
+            return None
+        if entry:
+            draft = {"mood": entry["mood"], "answers": safe_json_loads(entry["answers_json"])}
+            self.mood, self.answers = draft["mood"], draft["answers"]
+            self.persisted = self._serialized()
+            return draft
+        return None
+
+    def update(self, mood: str, answers: Dict[str, Any], now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        before = self._serialized()
+        self.mood, self.answers = mood, dict(answers)
+        if self.persisted is None:
+            # First render of an untouched form: that's the baseline, not an edit.
+            self.persisted = self._serialized()
+            return
+        if self._serialized() != before:
+            if before == self.persisted:
+                self.first_change_at = now
+            self.last_change_at = now
+
+    def maybe_flush(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if not self.dirty:
+            return False
+        quiet = now - self.last_change_at >= DRAFT_DEBOUNCE_SECONDS
+        overdue = now - self.first_change_at >= DRAFT_MAX_WAIT_SECONDS
+        return self.flush(now) if (quiet or overdue) else False
+
+    def flush(self, now: Optional[float] = None) -> bool:
+        if not self.dirty:
+            return False
+        serialized = self._serialized()
+        save_draft(self.user_id, self.entry_date, self.mood, safe_json_dumps(self.answers))
+        self.persisted = serialized
+        self.last_flush_at = time.monotonic() if now is None else now
+        return True
+
+    def mark_saved(self) -> None:
+        """Call after an explicit save/generate; the next visit reloads from the DB."""
+        self.entry_date, self.mood, self.answers = "", "", {}
+        self.persisted, self.locked = None, False
+
+
+def get_draft_buffer(user_id: str) -> DraftBuffer:
+    buf = st.session_state.get(_STATE_KEY)
+    if buf is None or buf.user_id != user_id:
+        buf = DraftBuffer(user_id=user_id)
+        st.session_state[_STATE_KEY] = buf
+    return buf
+
+
+def flush_pending_draft() -> None:
+    """Call at the top of every other page: leaving New Entry flushes what's pending."""
+    buf = st.session_state.get(_STATE_KEY)
+    if buf is not None:
+        buf.flush()
@@ -0,0 +1,252 @@
+"""
+Perceptual hashes and near-duplicate clustering for photos.
+
+Each photo gets a 64-bit difference hash (dHash) and a sharpness score at
+ingest. Two photos whose hashes differ in at most NEAR_DUP_BITS bits are
+treated as the same shot; renderers keep only the sharpest of each group.
+
+    python media_index.py scan [--user demo] [--threshold 6] [--backfill]
+"""
+import argparse
+import io
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from db import list_journal_media, set_media_fingerprint
+from storage import get_storage
+
+NEAR_DUP_BITS = 6
+
+_HASH_SIZE = 8  # 8x8 = 64 bits
+_SHARPNESS_SIZE = 128
+# Big buckets are compared in row slices so each distance matrix stays ~4M cells
+# and each slice hands at most ~64k edges to the union-find.
+_MAX_CELLS = 4_000_000
+_MAX_EDGES = 65_536
+
+
+def photo_fingerprint(content_bytes: bytes) -> Tuple[Optional[str], Optional[float]]:
+    """
+    Returns (phash, sharpness), or (None, None) if the bytes aren't a readable image.
+    """
+    try:
+        with Image.open(io.BytesIO(content_bytes)) as img:
+            # JPEGs decode straight to a reduced grayscale image instead of full size.
+            img.draft("L", (_SHARPNESS_SIZE * 2, _SHARPNESS_SIZE * 2))
+            img = ImageOps.exif_transpose(img).convert("L")
+            small = np.asarray(img.resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.LANCZOS), dtype=np.int16)
+            thumb = np.asarray(img.resize((_SHARPNESS_SIZE, _SHARPNESS_SIZE), Image.Resampling.BILINEAR), dtype=np.float32)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        return None, None
+
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    phash = int(np.packbits(bits).view(">u8")[0])
+
+    # Variance of the Laplacian: blurry / shaky shots score low.
+    lap = (
+        thumb[:-2, 1:-1] + thumb[2:, 1:-1] + thumb[1:-1, :-2] + thumb[1:-1, 2:]
+        - 4.0 * thumb[1:-1, 1:-1]
+    )
+    return f"{phash:016x}", float(lap.var())
+
+
+def _popcount64(x: np.ndarray) -> np.ndarray:
+    # SWAR popcount for NumPy < 2.0, which has no bitwise_count ufunc.
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+_popcount = getattr(np, "bitwise_count", _popcount64)
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Bitwise distance between uint64 hashes, broadcast like a ^ b."""
+    return _popcount(np.bitwise_xor(a, b))
+
+
+def _find(parent: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Roots of x in a union-find parent array, compressing the paths it walks."""
+    r = parent[x]
+    while True:
+        rr = parent[r]
+        if np.array_equal(rr, r):
+            break
+        r = rr
+    parent[x] = r
+    return r
+
+
+def _union(parent: np.ndarray, a: np.ndarray, b: np.ndarray) -> None:
+    """Merge the sets of a[k] and b[k] for every k. Larger roots hang under smaller ones."""
+    touched = np.concatenate([a, b])
+    while len(a):
+        ra, rb = _find(parent, a), _find(parent, b)
+        keep = ra != rb
+        a, b = np.maximum(ra[keep], rb[keep]), np.minimum(ra[keep], rb[keep])
+        # If one root gets several writes, one wins; the rest retry on the next pass.
+        parent[a] = b
+    # Flatten what we just linked so later finds stay shallow.
+    _find(parent, touched)
+
+
+class PhashIndex:
+    """
+    Near-duplicate search over many 64-bit hashes.
+
+    Pigeonhole trick: split the 64 bits into threshold+1 bands; any two hashes
+    within `threshold` bits agree exactly on at least one band. So only hashes
+    sharing a band value are compared, instead of all n^2 pairs. Matches go
+    straight into a union-find, so memory stays flat however big a cluster gets.
+    """
+
+    def __init__(self, hashes: Sequence[str]):
+        self.hashes = np.array([int(h, 16) for h in hashes], dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def clusters(self, threshold: int = NEAR_DUP_BITS) -> np.ndarray:
+        """Cluster label per hash (the smallest index in its connected group)."""
+        n = len(self.hashes)
+        if n < 2:
+            return np.arange(n)
+
+        # Identical hashes always cluster, so index each distinct value once.
+        uniq, inverse = np.unique(self.hashes, return_inverse=True)
+        inverse = inverse.ravel()
+        parent = np.arange(len(uniq))
+
+        n_bands = min(threshold + 1, 64)
+        edges = np.linspace(0, 64, n_bands + 1).astype(int)
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            keys = (uniq >> np.uint64(lo)) & np.uint64((1 << (hi - lo)) - 1)
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            sizes = np.diff(np.r_[starts, len(uniq)])
+            for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                self._merge_bucket(uniq, parent, order[start:start + size], threshold)
+            _find(parent, np.arange(len(uniq)))
+
+        # Map back to the caller's indexes; label = smallest original index in the cluster.
+        cluster = _find(parent, np.arange(len(uniq)))[inverse]
+        first = np.full(len(uniq), n)
+        np.minimum.at(first, cluster, np.arange(n))
+        return first[cluster]
+
+    @staticmethod
+    def _merge_bucket(hashes: np.ndarray, parent: np.ndarray, members: np.ndarray, threshold: int) -> None:
+        roots = _find(parent, members)
+        root_ids, group, counts = np.unique(roots, return_inverse=True, return_counts=True)
+        if len(root_ids) == 1:
+            return
+        group = group.ravel()
+
+        # Any unmerged near pair has at least one member outside the biggest
+        # group, so only those rows need comparing against the whole bucket.
+        rows = np.flatnonzero(group != counts.argmax())
+        h = hashes[members]
+
+        s = 0
+        while s < len(rows):
+            if s:
+                # Regroup by current root: once a burst has merged, it is one
+                # edge target instead of thousands.
+                root_ids, group, counts = np.unique(_find(parent, members), return_inverse=True, return_counts=True)
+                group = group.ravel()
+            cols = np.argsort(group, kind="stable")
+            col_starts = np.r_[0, np.cumsum(counts)[:-1]]
+
+            block = max(1, min(_MAX_CELLS // len(members), _MAX_EDGES // len(root_ids)))
+            r = rows[s:s + block]
+            s += block
+            near = hamming(h[r, None], h[None, cols]) <= threshold
+            # One edge per (row, root group) it touches, never per pair.
+            touches = np.logical_or.reduceat(near, col_starts, axis=1)
+            ri, gi = np.nonzero(touches)
+            _union(parent, members[r[ri]], root_ids[gi])
+
+
+def group_near_duplicates(media_items: List[Dict[str, Any]], threshold: int = NEAR_DUP_BITS) -> List[List[Dict[str, Any]]]:
+    """
+    Groups items in first-seen order. Videos and photos without a hash
+    are always their own group.
+    """
+    hashed = [k for k, m in enumerate(media_items) if m["media_type"] == "photo" and m.get("phash")]
+    label_of: Dict[int, int] = {}
+    if hashed:
+        labels = PhashIndex([media_items[k]["phash"] for k in hashed]).clusters(threshold)
+        label_of = {k: hashed[int(lbl)] for k, lbl in zip(hashed, labels)}
+
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for k, m in enumerate(media_items):
+        groups.setdefault(label_of.get(k, k), []).append(m)
+    return list(groups.values())
+
+
+def curate_media(media_items: List[Dict[str, Any]], limit: int, threshold: int = NEAR_DUP_BITS) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` distinct items, in upload order: the sharpest photo of each
+    near-duplicate group, plus every video.
+    """
+    picked = []
+    for group in group_near_duplicates(media_items, threshold):
+        best = max(group, key=lambda m: m.get("sharpness") or 0.0)
+        picked.append(best)
+    order = {id(m): k for k, m in enumerate(media_items)}
+    picked.sort(key=lambda m: order[id(m)])
+    return picked[:limit]
+
+
+def backfill_fingerprints(media_items: List[Dict[str, Any]]) -> int:
+    """Hash photos stored before fingerprints existed. Returns how many were updated."""
+    storage = get_storage()
+    updated = 0
+    for m in media_items:
+        if m["media_type"] != "photo" or m.get("phash"):
+            continue
+        if not storage.exists(m["file_path"]):
+            continue
+        m["phash"], m["sharpness"] = photo_fingerprint(storage.get(m["file_path"]))
+        if m["phash"]:
+            set_media_fingerprint(m["id"], m["phash"], m["sharpness"])
+            updated += 1
+    return updated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Find near-duplicate photos across a journal.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    scan = sub.add_parser("scan", help="Cluster every photo in a user's journal.")
+    scan.add_argument("--user", default="demo")
+    scan.add_argument("--threshold", type=int, default=NEAR_DUP_BITS)
+    scan.add_argument("--backfill", action="store_true", help="Fingerprint photos that don't have a hash yet.")
+    args = parser.parse_args(argv)
+
+    items = list_journal_media(args.user)
+    if args.backfill:
+        print(f"Fingerprinted {backfill_fingerprints(items)} photo(s).")
+
+    photos = [m for m in items if m["media_type"] == "photo" and m.get("phash")]
+    t0 = time.perf_counter()
+    groups = group_near_duplicates(photos, args.threshold)
+    elapsed = time.perf_counter() - t0
+
+    dupes = [g for g in groups if len(g) > 1]
+    for g in dupes:
+        names = ", ".join(f"{m['original_name']} (entry {m['entry_id']})" for m in g)
+        print(f"{len(g)} near-duplicates: {names}")
+    print(
+        f"{len(photos)} photos, {len(groups)} distinct, "
+        f"{sum(len(g) - 1 for g in dupes)} redundant · {elapsed:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,6 +3,8 @@ from datetime import date
 from db import upsert_entry, add_media
 from utils import today_iso, safe_json_dumps, save_upload
 from llm import generate_journal
+from drafts import DRAFT_DEBOUNCE_SECONDS, get_draft_buffer
+from media_index import photo_fingerprint
 
 st.set_page_config(page_title="New Entry", page_icon="➕", layout="wide")
 
@@ -10,60 +12,81 @@ USER_ID = "demo"  # MVP user
 
 st.title("➕ New Entry")
 
-# Date default = today, user can change it
+draft_buffer = get_draft_buffer(USER_ID)
+
+# Streamlit drops widget state when you leave a page, so a missing key means
+# the page was just (re)opened and the form should be restored from the draft.
+form_is_fresh = "ne_mood" not in st.session_state
+
+# Date default = today (or the draft you were last on), user can change it
+if "ne_entry_date" not in st.session_state:
+    st.session_state["ne_entry_date"] = date.fromisoformat(draft_buffer.entry_date or today_iso())
 entry_date = st.date_input(
     "Entry date",
-    value=date.fromisoformat(today_iso()),
+    key="ne_entry_date",
     help="Defaults to today. Change this to backfill a missed day.",
 )
+entry_date_iso = entry_date.isoformat()
+
+if form_is_fresh or draft_buffer.entry_date != entry_date_iso:
+    draft = draft_buffer.load(entry_date_iso)
+    if draft:
+        st.session_state["ne_mood"] = draft["mood"]
+        for name, value in draft["answers"].items():
+            st.session_state[f"ne_{name}"] = value
+st.session_state.setdefault("ne_mood", "Good")
 
 st.caption("Tip: keep it quick. Most questions are Yes/No — only the relevant follow-ups appear.")
 
-mood = st.selectbox("How was today?", ["Great", "Good", "Ok", "Hard", "Rough"], index=1)
+mood = st.selectbox("How was today?", ["Great", "Good", "Ok", "Hard", "Rough"], key="ne_mood")
 
 st.divider()
 
 colA, colB = st.columns([1, 1])
 
+# Widget keys are "ne_<answers key>" so a restored draft maps straight back onto the form.
 with colA:
-    went_anywhere = st.toggle("Did you go anywhere today?", value=False)
+    went_anywhere = st.toggle("Did you go anywhere today?", value=False, key="ne_went_anywhere")
 where = ""
 where_activity = ""
+memorable = False
+memorable_text = ""
+new_people = False
+new_people_text = ""
 if went_anywhere:
-    where = st.text_input("Where did you go?", placeholder="e.g., Dayboro Showgrounds, South Bank, Noosa")
+    where = st.text_input("Where did you go?", placeholder="e.g., Dayboro Showgrounds, South Bank, Noosa", key="ne_where")
     where_activity = st.text_area(
         "What did you do there? (optional)",
         height=80,
         placeholder="e.g., Went for a jog, grabbed lunch, explored the markets.",
+        key="ne_where_activity",
     )
 
-    memorable = st.toggle("Did you do something memorable?", value=False)
-    memorable_text = ""
+    memorable = st.toggle("Did you do something memorable?", value=False, key="ne_memorable")
     if memorable:
-        memorable_text = st.text_area("What happened?", height=80, placeholder="1–2 sentences is plenty.")
+        memorable_text = st.text_area("What happened?", height=80, placeholder="1–2 sentences is plenty.", key="ne_memorable_text")
 
-    new_people = st.toggle("Did you meet or talk to someone new?", value=False)
-    new_people_text = ""
+    new_people = st.toggle("Did you meet or talk to someone new?", value=False, key="ne_new_people")
     if new_people:
-        new_people_text = st.text_area("What was the interaction?", height=80, placeholder="Quick summary is fine.")
+        new_people_text = st.text_area("What was the interaction?", height=80, placeholder="Quick summary is fine.", key="ne_new_people_text")
 
 with colB:
-    challenges = st.toggle("Any challenges today?", value=False)
+    challenges = st.toggle("Any challenges today?", value=False, key="ne_challenges")
     challenges_text = ""
     handled_text = ""
     if challenges:
-        challenges_text = st.text_area("What was tough?", height=80, placeholder="What made it hard?")
-        handled_text = st.text_area("How did you handle it? (optional)", height=80, placeholder="What did you do next?")
+        challenges_text = st.text_area("What was tough?", height=80, placeholder="What made it hard?", key="ne_challenges_text")
+        handled_text = st.text_area("How did you handle it? (optional)", height=80, placeholder="What did you do next?", key="ne_handled_text")
 
-    wins = st.toggle("Any wins or progress?", value=False)
+    wins = st.toggle("Any wins or progress?", value=False, key="ne_wins")
     wins_text = ""
     if wins:
-        wins_text = st.text_area("What went well?", height=80, placeholder="Something you’re glad happened.")
+        wins_text = st.text_area("What went well?", height=80, placeholder="Something you’re glad happened.", key="ne_wins_text")
 
-    learnings = st.toggle("Any learnings today?", value=False)
+    learnings = st.toggle("Any learnings today?", value=False, key="ne_learnings")
     learnings_text = ""
     if learnings:
-        learnings_text = st.text_area("What did you learn?", height=80, placeholder="A thought worth keeping.")
+        learnings_text = st.text_area("What did you learn?", height=80, placeholder="A thought worth keeping.", key="ne_learnings_text")
 
 st.divider()
 
@@ -93,6 +116,23 @@ answers = {
     "learnings_text": learnings_text,
 }
 
+draft_buffer.update(mood, answers)
+
+
+@st.fragment(run_every=DRAFT_DEBOUNCE_SECONDS)
+def autosave_status() -> None:
+    buf = get_draft_buffer(USER_ID)
+    buf.maybe_flush()
+    if buf.locked:
+        st.caption("Autosave is off: this date already has a finished entry.")
+    elif buf.dirty:
+        st.caption("Unsaved changes…")
+    elif buf.last_flush_at:
+        st.caption("Draft autosaved.")
+
+
+autosave_status()
+
 col1, col2, col3 = st.columns([1, 1, 2])
 
 with col1:
@@ -104,8 +144,6 @@ with col2:
 with col3:
     st.info("You can generate even with zero uploads. Add media later and regenerate.", icon="ℹ️")
 
-entry_date_iso = entry_date.isoformat()
-
 if save_draft:
     entry_id = upsert_entry(
         user_id=USER_ID,
@@ -120,7 +158,9 @@ if save_draft:
         for f in uploads:
             content = f.getvalue()
             file_path, media_type = save_upload(f.name, content)
-            add_media(entry_id, media_type, file_path, f.name)
+            phash, sharpness = photo_fingerprint(content) if media_type == "photo" else (None, None)
+            add_media(entry_id, media_type, file_path, f.name, phash=phash, sharpness=sharpness)
+    draft_buffer.mark_saved()
     st.success(f"Saved draft for {entry_date_iso}.")
     st.session_state["view_entry_id"] = entry_id
     st.switch_page("pages/3_View_Entry.py")
@@ -140,7 +180,8 @@ if generate:
         for f in uploads:
             content = f.getvalue()
             file_path, media_type = save_upload(f.name, content)
-            add_media(entry_id, media_type, file_path, f.name)
+            phash, sharpness = photo_fingerprint(content) if media_type == "photo" else (None, None)
+            add_media(entry_id, media_type, file_path, f.name, phash=phash, sharpness=sharpness)
             media_count += 1
 
     payload = {
@@ -161,6 +202,7 @@ if generate:
         generated_json=safe_json_dumps(generated),
     )
 
+    draft_buffer.mark_saved()
     st.success("Generated your journal page.")
     st.session_state["view_entry_id"] = entry_id
     st.switch_page("pages/3_View_Entry.py")
@@ -1,8 +1,11 @@
 import streamlit as st
 from db import list_entries
+from drafts import flush_pending_draft
 
 st.set_page_config(page_title="My Journal", page_icon="📚", layout="wide")
 
+flush_pending_draft()
+
 USER_ID = "demo"  # MVP user
 
 st.title("📚 My Journal")
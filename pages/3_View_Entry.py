@@ -3,9 +3,13 @@ import markdown as md  # Streamlit bundles markdown rendering internally, but we
 from db import get_entry, list_media
 from utils import safe_json_loads
 from renderers import render_entry_html
+from storage import get_storage
+from drafts import flush_pending_draft
 
 st.set_page_config(page_title="View Entry", page_icon="🖼️", layout="wide")
 
+flush_pending_draft()
+
 st.title("🖼️ Entry")
 
 entry_id = st.session_state.get("view_entry_id", None)
@@ -38,12 +42,14 @@ with left:
     if not media_items:
         st.caption("No media added yet.")
     else:
+        storage = get_storage()
         for m in media_items:
             st.caption(f"{m['media_type'].upper()}: {m['original_name']}")
+            media_url = storage.url(m["file_path"])
             if m["media_type"] == "video":
-                st.video(m["file_path"])
+                st.video(media_url)
             else:
-                st.image(m["file_path"], use_column_width=True)
+                st.image(media_url, use_column_width=True)
 
 with right:
     st.subheader("Scrapbook Page")
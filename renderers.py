@@ -1,5 +1,7 @@
 from typing import Any, Dict, List
 from html import escape
+from storage import get_storage
+from media_index import curate_media
 
 def _css_base() -> str:
     return """
@@ -67,9 +69,10 @@ def render_entry_html(
     chips_html = f'<div class="chips">{"".join(chips)}</div>' if chips else ""
 
     def media_block(items: List[Dict[str, Any]], polaroid: bool = False) -> str:
+        storage = get_storage()
         blocks = []
         for m in items:
-            path = m["file_path"]
+            path = storage.url(m["file_path"])
             mt = m["media_type"]
             name = m.get("original_name", "")
             caption = escape(name) if name else ""
@@ -88,7 +91,7 @@ def render_entry_html(
 
     media_html = ""
     if template == "polaroid_trail":
-        media_html = media_block(media_items[:8], polaroid=True)
+        media_html = media_block(curate_media(media_items, 8), polaroid=True)
         layout = f"""
           <div class="grid two">
             <div>
@@ -104,7 +107,7 @@ def render_entry_html(
           </div>
         """
     elif template == "postcard_map":
-        media_html = media_block(media_items[:6], polaroid=False)
+        media_html = media_block(curate_media(media_items, 6), polaroid=False)
         loc = location.strip()
         map_card = ""
         if loc:
@@ -129,8 +132,9 @@ def render_entry_html(
           </div>
         """
     else:  # minimal_editorial
-        hero = media_items[:1]
-        rest = media_items[1:5]
+        picked = curate_media(media_items, 5)
+        hero = picked[:1]
+        rest = picked[1:5]
         hero_html = media_block(hero, polaroid=False) if hero else ""
         rest_html = media_block(rest, polaroid=False) if rest else ""
         layout = f"""
@@ -0,0 +1,369 @@
+"""
+Media storage backends.
+
+`media.file_path` holds a backend-neutral key (e.g. "beach-1a2b3c4d5e6f.jpg"),
+never a local path, so every app replica resolves the same row to the same object.
+
+Pick the backend with environment variables:
+
+    MEDIA_STORAGE=local                      # default, files under data/media/
+    MEDIA_STORAGE=s3
+    MEDIA_S3_BUCKET=my-journal-media
+    MEDIA_S3_PREFIX=media/                   # optional
+    MEDIA_S3_ENDPOINT_URL=http://localhost:9000  # optional: MinIO, moto_server, R2, ...
+
+The S3 backend needs `boto3`. For local development, run any S3-compatible
+stand-in (`moto_server -p 9000`, or MinIO) and point MEDIA_S3_ENDPOINT_URL at it.
+
+    python storage.py check    # multipart logic offline, then a round trip
+                               # against MEDIA_S3_ENDPOINT_URL if it is set
+"""
+import argparse
+import os
+import random
+import time
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+MEDIA_DIR = Path("data/media")
+MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+
+# Rows written before the storage layer existed stored "data/media/<name>".
+_LEGACY_PREFIX = MEDIA_DIR.as_posix().rstrip("/") + "/"
+
+_CHUNK = 1024 * 1024
+
+# Half-written local uploads end in this suffix until they are renamed into place.
+TEMP_SUFFIX = ".tmp"
+
+
+def normalize_key(key: str) -> str:
+    key = key.replace("\\", "/")
+    if key.startswith(_LEGACY_PREFIX):
+        key = key[len(_LEGACY_PREFIX):]
+    return key.lstrip("/")
+
+
+class MediaStorage(ABC):
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def stream(self, key: str, chunk_size: int = _CHUNK) -> Iterator[bytes]:
+        ...
+
+    @abstractmethod
+    def url(self, key: str, expires: int = 3600) -> str:
+        """Something st.image / st.video / an <img src> can load."""
+
+
+class LocalStorage(MediaStorage):
+    def __init__(self, root: Path = MEDIA_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / normalize_key(key)).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid media key: {key!r}")
+        return path
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name: two sessions can upload the same photo at once.
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=TEMP_SUFFIX, delete=False) as f:
+            f.write(data)
+        try:
+            os.replace(f.name, path)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def stream(self, key: str, chunk_size: int = _CHUNK) -> Iterator[bytes]:
+        with self._path(key).open("rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                yield block
+
+    def url(self, key: str, expires: int = 3600) -> str:
+        # Same value the app used before keys existed: a path relative to the working dir.
+        return str(self.root / normalize_key(key))
+
+
+class S3Storage(MediaStorage):
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        max_pool_connections: int = 32,
+        multipart_threshold: int = 16 * 1024 * 1024,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+        client: Any = None,
+    ):
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError as e:
+            raise RuntimeError("MEDIA_STORAGE=s3 requires boto3 (pip install boto3).") from e
+
+        # S3 rejects multipart parts under 5 MiB (except the last one).
+        if part_size < 5 * 1024 * 1024:
+            raise ValueError("part_size must be at least 5 MiB")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self._client_error = ClientError
+
+        config = Config(
+            max_pool_connections=max_pool_connections,
+            retries={"max_attempts": 5, "mode": "standard"},
+            # Stand-in servers (MinIO, moto) rarely do virtual-hosted buckets.
+            s3={"addressing_style": "path"} if endpoint_url else {},
+        )
+        # One client shared across threads: botocore clients are thread-safe and
+        # keep a pooled set of keep-alive connections.
+        self._client = client or boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name, config=config)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="s3-media")
+
+    def _key(self, key: str) -> str:
+        return self.prefix + normalize_key(key)
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        extra: Dict[str, Any] = {"ContentType": content_type} if content_type else {}
+        if len(data) < self.multipart_threshold:
+            self._client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data, **extra)
+            return
+        self._put_multipart(self._key(key), data, extra)
+
+    def _put_multipart(self, s3_key: str, data: bytes, extra: Dict[str, Any]) -> None:
+        upload_id = self._client.create_multipart_upload(Bucket=self.bucket, Key=s3_key, **extra)["UploadId"]
+        view = memoryview(data)
+        futures: List[Future] = []
+
+        def upload_part(number: int, offset: int) -> Dict[str, Any]:
+            body = view[offset:offset + self.part_size].tobytes()
+            resp = self._client.upload_part(
+                Bucket=self.bucket, Key=s3_key, UploadId=upload_id, PartNumber=number, Body=body,
+            )
+            return {"PartNumber": number, "ETag": resp["ETag"]}
+
+        try:
+            futures = [
+                self._pool.submit(upload_part, i + 1, offset)
+                for i, offset in enumerate(range(0, len(data), self.part_size))
+            ]
+            parts: List[Dict[str, Any]] = [f.result() for f in futures]
+            self._client.complete_multipart_upload(
+                Bucket=self.bucket, Key=s3_key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            # Let parts already in flight finish so none lands after the abort.
+            wait(futures)
+            self._client.abort_multipart_upload(Bucket=self.bucket, Key=s3_key, UploadId=upload_id)
+            raise
+
+    def get(self, key: str) -> bytes:
+        return self._client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                return False
+            raise
+
+    def stream(self, key: str, chunk_size: int = _CHUNK) -> Iterator[bytes]:
+        body = self._client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def url(self, key: str, expires: int = 3600) -> str:
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=expires,
+        )
+
+
+_storage: Optional[MediaStorage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> MediaStorage:
+    # One backend per process; Streamlit reruns scripts but keeps modules loaded.
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = _storage_from_env()
+    return _storage
+
+
+def _storage_from_env() -> MediaStorage:
+    kind = os.getenv("MEDIA_STORAGE", "local").strip().lower()
+    if kind == "local":
+        return LocalStorage()
+    if kind == "s3":
+        bucket = os.getenv("MEDIA_S3_BUCKET", "").strip()
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE=s3 requires MEDIA_S3_BUCKET.")
+        return S3Storage(
+            bucket=bucket,
+            prefix=os.getenv("MEDIA_S3_PREFIX", ""),
+            endpoint_url=os.getenv("MEDIA_S3_ENDPOINT_URL") or None,
+            region_name=os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or None,
+        )
+    raise RuntimeError(f"Unknown MEDIA_STORAGE: {kind!r} (expected 'local' or 's3')")
+
+
+class _RecordingS3Client:
+    """Just enough of an S3 client to drive _put_multipart offline."""
+
+    def __init__(self, fail_part: Optional[int] = None):
+        self.fail_part = fail_part
+        self.parts: Dict[int, bytes] = {}
+        self.calls: List[str] = []
+        self.completed: Optional[List[Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        self.calls.append("create")
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, PartNumber: int, Body: bytes, **kwargs: Any) -> Dict[str, Any]:
+        # Random delay so parts finish out of order, like they do over the network.
+        time.sleep(random.uniform(0, 0.02))
+        if PartNumber == self.fail_part:
+            raise RuntimeError(f"part {PartNumber} failed")
+        with self._lock:
+            self.parts[PartNumber] = Body
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, MultipartUpload: Dict[str, Any], **kwargs: Any) -> None:
+        self.calls.append("complete")
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, **kwargs: Any) -> None:
+        self.calls.append("abort")
+
+
+def _check(ok: bool, label: str) -> None:
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    if not ok:
+        raise SystemExit(1)
+
+
+def _check_multipart_offline() -> None:
+    part = 5 * 1024 * 1024
+    data = os.urandom(3 * part + 1234)
+
+    fake = _RecordingS3Client()
+    s3 = S3Storage("check", part_size=part, multipart_threshold=part, client=fake)
+    s3.put("big.bin", data)
+    _check(sorted(fake.parts) == [1, 2, 3, 4], "parts are numbered 1..4")
+    _check(b"".join(fake.parts[n] for n in sorted(fake.parts)) == data, "parts reassemble to the original bytes")
+    _check(
+        fake.completed == [{"PartNumber": n, "ETag": f'"etag-{n}"'} for n in (1, 2, 3, 4)],
+        "complete lists parts in order with their ETags",
+    )
+
+    fake = _RecordingS3Client(fail_part=2)
+    s3 = S3Storage("check", part_size=part, multipart_threshold=part, client=fake)
+    try:
+        s3.put("big.bin", data)
+        raised = False
+    except RuntimeError:
+        raised = True
+    _check(raised, "a failed part raises")
+    _check(fake.calls == ["create", "abort"], "a failed part aborts the upload and never completes it")
+
+
+def _check_live(endpoint_url: str) -> None:
+    import boto3
+
+    bucket = os.getenv("MEDIA_S3_BUCKET", "").strip() or "journal-media-check"
+    region = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+    raw = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+    existing = {b["Name"] for b in raw.list_buckets().get("Buckets", [])}
+    if bucket not in existing:
+        raw.create_bucket(Bucket=bucket)
+
+    part = 5 * 1024 * 1024
+    s3 = S3Storage(bucket, prefix="storage-check", endpoint_url=endpoint_url, region_name=region,
+                   part_size=part, multipart_threshold=part)
+    small, big = os.urandom(1000), os.urandom(2 * part + 77)
+
+    s3.put("small.bin", small, content_type="application/octet-stream")
+    s3.put("big.bin", big)
+    _check(s3.exists("small.bin") and s3.exists("big.bin"), "exists() after put_object and multipart put")
+    _check(not s3.exists("missing.bin"), "exists() is False for a missing key")
+    _check(s3.get("small.bin") == small, "get() round-trips a small object")
+    _check(b"".join(s3.stream("big.bin", chunk_size=part)) == big, "stream() round-trips a multipart object")
+    _check(s3.url("small.bin").startswith(("http://", "https://")), "url() returns a presigned URL")
+
+    real_upload_part = s3._client.upload_part
+
+    def failing_upload_part(**kwargs: Any) -> Any:
+        if kwargs["PartNumber"] == 2:
+            raise RuntimeError("injected failure")
+        return real_upload_part(**kwargs)
+
+    s3._client.upload_part = failing_upload_part
+    try:
+        s3.put("aborted.bin", big)
+    except RuntimeError:
+        pass
+    finally:
+        s3._client.upload_part = real_upload_part
+    pending = raw.list_multipart_uploads(Bucket=bucket, Prefix="storage-check/aborted.bin").get("Uploads", [])
+    _check(not pending and not s3.exists("aborted.bin"), "a failed multipart upload is aborted on the server")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Media storage tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("check", help="Exercise the S3 backend (offline, plus MEDIA_S3_ENDPOINT_URL if set).")
+    parser.parse_args(argv)
+
+    _check_multipart_offline()
+    endpoint_url = os.getenv("MEDIA_S3_ENDPOINT_URL")
+    if endpoint_url:
+        _check_live(endpoint_url)
+    else:
+        print("MEDIA_S3_ENDPOINT_URL not set; skipped the live round trip.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
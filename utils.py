@@ -2,11 +2,11 @@ import json
 import re
 from datetime import date
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Tuple
 import hashlib
+import mimetypes
 
-MEDIA_DIR = Path("data/media")
-MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+from storage import get_storage
 
 def today_iso() -> str:
     return date.today().isoformat()
@@ -40,10 +40,12 @@ def detect_media_type(filename: str) -> str:
 
 def save_upload(original_name: str, content_bytes: bytes) -> Tuple[str, str]:
     """
-    Returns (file_path, media_type)
+    Returns (storage_key, media_type)
     """
     media_type = detect_media_type(original_name)
-    fname = stable_file_name(original_name, content_bytes)
-    out_path = MEDIA_DIR / fname
-    out_path.write_bytes(content_bytes)
-    return str(out_path), media_type
+    key = stable_file_name(original_name, content_bytes)
+    storage = get_storage()
+    # Names embed a content digest, so an existing key already holds these bytes.
+    if not storage.exists(key):
+        storage.put(key, content_bytes, content_type=mimetypes.guess_type(key)[0])
+    return key, media_type